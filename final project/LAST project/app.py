@@ -1,76 +1,132 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, jsonify
+import click
+from flask import Flask, render_template, redirect, url_for, request, flash, session, jsonify, Response
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
+from flask_session import Session
+from sqlalchemy import event, lambda_stmt, select
+from sqlalchemy.orm import selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
+from pydantic import ValidationError
 from forms import RegisterForm, LoginForm
+from schemas import ProductIn, CartItemIn
 from models import db, User, ForumPost, Product, Cart
 from config import Config
 from datetime import datetime
+import atexit
+import hashlib
+import json
+from operator import itemgetter
+import queue
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 # ------------------- APP INITIALIZATION -------------------
 
 app = Flask(__name__)
 app.config.from_object(Config)
 db.init_app(app)
+cache = Cache(app)
+Session(app)
+
+
+# SQLite: WAL lets readers run alongside a writer, and synchronous=NORMAL only fsyncs at checkpoints
+def _sqlite_pragma(dbapi_conn, conn_record):
+    cur = dbapi_conn.cursor()
+    cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute('PRAGMA synchronous=NORMAL')
+    cur.execute('PRAGMA temp_store=MEMORY')
+    cur.execute('PRAGMA cache_size=-20000')  # 20MB
+    cur.close()
+
 
-# Create database tables if they do not exist
 with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', _sqlite_pragma)
+
+
+# ------------------- DATABASE SETUP -------------------
+
+# Run once per deployment with `flask --app app init-db` rather than on every import
+@app.cli.command('init-db')
+def init_db():
+    """Create database tables and add sample products if none exist."""
     db.create_all()
-    # Add agriculture sample products if none exist
-    if Product.query.count() == 0:
-        sample_products = [
-            Product(
-                name='Organic Tomatoes', 
-                category='Vegetables', 
-                price=3.99, 
-                image='https://images.unsplash.com/photo-1546470427-e212d4d25323?w=400',
-                description='Fresh organic tomatoes grown without pesticides, perfect for salads and cooking.',
-                stock=50
-            ),
-            Product(
-                name='Fresh Apples', 
-                category='Fruits', 
-                price=2.49, 
-                image='https://images.unsplash.com/photo-1568702846914-96b305d2aaeb?w=400',
-                description='Crisp and juicy red apples, hand-picked from our orchard.',
-                stock=75
-            ),
-            Product(
-                name='Whole Wheat Flour', 
-                category='Grains', 
-                price=4.99, 
-                image='https://images.unsplash.com/photo-1574323347407-f5e1ad6d020b?w=400',
-                description='Stone-ground whole wheat flour from organic wheat grains.',
-                stock=30
-            ),
-            Product(
-                name='Farm Fresh Eggs', 
-                category='Dairy', 
-                price=5.99, 
-                image='https://images.unsplash.com/photo-1582722872445-44dc5f7e3c8f?w=400',
-                description='Free-range eggs from happy chickens raised on natural feed.',
-                stock=40
-            ),
-            Product(
-                name='Organic Spinach', 
-                category='Organic', 
-                price=2.99, 
-                image='https://images.unsplash.com/photo-1576045057995-568f588f82fb?w=400',
-                description='Tender organic spinach leaves, packed with nutrients.',
-                stock=60
-            ),
-            Product(
-                name='Garden Shovel', 
-                category='Farm Tools', 
-                price=24.99, 
-                image='https://images.unsplash.com/photo-1572984334707-0c0df46957a9?w=400',
-                description='Durable steel garden shovel perfect for all your farming needs.',
-                stock=15
-            )
-        ]
-        for product in sample_products:
-            db.session.add(product)
-        db.session.commit()
-        print("✅ Agriculture sample products added to database!")
+    # Databases created before prices moved to integer cents get the new column, backfilled
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('product')}
+    if 'price_cents' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE product ADD COLUMN price_cents INTEGER'))
+            conn.execute(db.text('UPDATE product SET price_cents = CAST(ROUND(price * 100) AS INTEGER)'))
+    # create_all skips tables that already exist, so add any missing indexes to them
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    # Add agriculture sample products if none exist (one transaction, so only one run seeds)
+    with db.session.begin():
+        if db.session.query(Product.id).first() is None:
+            sample_products = [
+                Product(
+                    name='Organic Tomatoes', 
+                    category='Vegetables', 
+                    price_cents=399, 
+                    image='https://images.unsplash.com/photo-1546470427-e212d4d25323?w=400',
+                    description='Fresh organic tomatoes grown without pesticides, perfect for salads and cooking.',
+                    stock=50
+                ),
+                Product(
+                    name='Fresh Apples', 
+                    category='Fruits', 
+                    price_cents=249, 
+                    image='https://images.unsplash.com/photo-1568702846914-96b305d2aaeb?w=400',
+                    description='Crisp and juicy red apples, hand-picked from our orchard.',
+                    stock=75
+                ),
+                Product(
+                    name='Whole Wheat Flour', 
+                    category='Grains', 
+                    price_cents=499, 
+                    image='https://images.unsplash.com/photo-1574323347407-f5e1ad6d020b?w=400',
+                    description='Stone-ground whole wheat flour from organic wheat grains.',
+                    stock=30
+                ),
+                Product(
+                    name='Farm Fresh Eggs', 
+                    category='Dairy', 
+                    price_cents=599, 
+                    image='https://images.unsplash.com/photo-1582722872445-44dc5f7e3c8f?w=400',
+                    description='Free-range eggs from happy chickens raised on natural feed.',
+                    stock=40
+                ),
+                Product(
+                    name='Organic Spinach', 
+                    category='Organic', 
+                    price_cents=299, 
+                    image='https://images.unsplash.com/photo-1576045057995-568f588f82fb?w=400',
+                    description='Tender organic spinach leaves, packed with nutrients.',
+                    stock=60
+                ),
+                Product(
+                    name='Garden Shovel', 
+                    category='Farm Tools', 
+                    price_cents=2499, 
+                    image='https://images.unsplash.com/photo-1572984334707-0c0df46957a9?w=400',
+                    description='Durable steel garden shovel perfect for all your farming needs.',
+                    stock=15
+                )
+            ]
+            db.session.bulk_save_objects(sample_products)
+            click.echo(f'Added {len(sample_products)} agriculture sample products to the database')
+
+
+# ------------------- QUERIES -------------------
+
+# Hot queries are built with lambda_stmt so SQLAlchemy caches their construction and compiled
+# SQL once, keyed on the lambda; closure values such as email or ids become bound parameters.
+
+def _user_by_email(email):
+    stmt = lambda_stmt(lambda: select(User).where(User.email == email))
+    return db.session.execute(stmt).scalar_one_or_none()
 
 
 # ------------------- ROUTES -------------------
@@ -88,12 +144,12 @@ def home():
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
-        existing_user = User.query.filter_by(email=form.email.data).first()
+        existing_user = _user_by_email(form.email.data)
         if existing_user:
             flash('Email already registered. Please log in.')
             return redirect(url_for('login'))
 
-        hashed = generate_password_hash(form.password.data)
+        hashed = generate_password_hash(form.password.data, method=app.config['PASSWORD_HASH_METHOD'])
         user = User(name=form.name.data, email=form.email.data, password=hashed)
         db.session.add(user)
         db.session.commit()
@@ -107,7 +163,7 @@ def register():
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = _user_by_email(form.email.data)
         if user and check_password_hash(user.password, form.password.data):
             session['user'] = user.id
             session['name'] = user.name
@@ -139,9 +195,76 @@ def profile():
 
 # ------------------- FORUM -------------------
 
+# New posts go through a bounded queue and are committed in batches by a background thread.
+# Readers put a threading.Event on the queue to flush: the writer commits everything queued
+# ahead of it straight away and sets the event, so a read only waits for earlier posts.
+# The queue is per process: with several workers, /forum only flushes its own worker's posts,
+# so a post queued on another worker can show up to FORUM_FLUSH_INTERVAL seconds later.
+_post_queue = queue.Queue(maxsize=app.config['FORUM_QUEUE_SIZE'])
+_post_writer = None
+_post_writer_lock = threading.Lock()
+
+
+def _save_posts(batch):
+    with app.app_context():
+        try:
+            db.session.bulk_save_objects([ForumPost(**post) for post in batch])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Failed to save %d forum posts', len(batch))
+
+
+def _write_posts():
+    while True:
+        batch = []
+        flush = None
+        entry = _post_queue.get()
+        deadline = time.monotonic() + app.config['FORUM_FLUSH_INTERVAL']
+        while True:
+            if isinstance(entry, threading.Event):
+                flush = entry
+                break
+            batch.append(entry)
+            timeout = deadline - time.monotonic()
+            if len(batch) >= app.config['FORUM_BATCH_SIZE'] or timeout <= 0:
+                break
+            try:
+                entry = _post_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+        if batch:
+            _save_posts(batch)
+        if flush:
+            flush.set()
+
+
+def _queue_post(post):
+    global _post_writer
+    with _post_writer_lock:
+        if _post_writer is None:
+            _post_writer = threading.Thread(target=_write_posts, daemon=True)
+            _post_writer.start()
+    _post_queue.put(post)
+
+
+def _flush_posts():
+    """Block until the posts queued before this call have been written."""
+    if _post_writer is None:
+        return
+    flushed = threading.Event()
+    _post_queue.put(flushed)
+    flushed.wait()
+
+
+# Don't drop queued posts when the process exits
+atexit.register(_flush_posts)
+
+
 @app.route('/forum')
 def forum():
-    posts = ForumPost.query.all()
+    _flush_posts()
+    posts = db.session.execute(lambda_stmt(lambda: select(ForumPost))).scalars().all()
     return render_template('forum.html', posts=posts)
 
 
@@ -155,9 +278,12 @@ def add_post():
     content = request.form.get('content')
 
     if title and content:
-        post = ForumPost(title=title, content=content, user_id=session['user'])
-        db.session.add(post)
-        db.session.commit()
+        _queue_post({
+            'title': title,
+            'content': content,
+            'user_id': session['user'],
+            'created_at': datetime.utcnow()
+        })
         flash('Post added successfully!')
     else:
         flash('Please enter a title and content.')
@@ -168,40 +294,56 @@ def add_post():
 # ------------------- SHOP -------------------
 
 @app.route('/shop')
+@cache.cached()
 def shop():
-    products = Product.query.all()
+    products = db.session.execute(lambda_stmt(lambda: select(Product))).scalars().all()
     return render_template('shop.html', products=products)
 
 
 @app.route('/add_to_cart/<int:product_id>', methods=['POST'])
 def add_to_cart(product_id):
     quantity = int(request.form.get('quantity', 1))
-    product = Product.query.get_or_404(product_id)
+    product = db.get_or_404(Product, product_id)
 
-    # Enhanced cart logic (session-based with duplicate handling)
-    cart = session.get('cart', {})
-    
-    if str(product_id) in cart:
-        cart[str(product_id)]['quantity'] += quantity
-    else:
-        cart[str(product_id)] = {
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'quantity': quantity,
-            'image': product.image
-        }
-    
-    session['cart'] = cart
+    # The session cart only maps product id -> quantity; product details are looked up on render.
+    # The dict is mutated in place, so flagging the session as modified is enough to save it.
+    cart = session.setdefault('cart', {})
+    cart[str(product_id)] = cart.get(str(product_id), 0) + quantity
     session.modified = True
     return jsonify({'success': True, 'message': f'{product.name} added to cart!', 'cart_count': len(cart)})
 
 
+_price_and_quantity = itemgetter('price_cents', 'quantity')
+
+
+def _cart_items(cart):
+    """Resolve a {product_id: quantity} session cart into item dicts with a single query."""
+    ids = [int(product_id) for product_id in cart]
+    rows = db.session.execute(lambda_stmt(
+        lambda: select(Product.id, Product.name, Product.price_cents, Product.image).where(Product.id.in_(ids))
+    )).all()
+    products = {row.id: row for row in rows}
+
+    cart_items = []
+    for product_id, quantity in cart.items():
+        product = products.get(int(product_id))
+        # Products deleted since they were added are dropped from the listing
+        if product:
+            cart_items.append({
+                'id': product.id,
+                'name': product.name,
+                'price_cents': product.price_cents,
+                'quantity': quantity,
+                'image': product.image
+            })
+    return cart_items
+
+
 @app.route('/cart')
 def view_cart():
     cart = session.get('cart', {})
-    cart_items = list(cart.values())
-    total = sum(item['price'] * item['quantity'] for item in cart_items)
+    cart_items = _cart_items(cart)
+    total = sum(price * quantity for price, quantity in map(_price_and_quantity, cart_items))
     return render_template('cart.html', cart=cart_items, total=total)
 
 
@@ -211,40 +353,61 @@ def remove_from_cart(product_id):
     product_id_str = str(product_id)
     
     if product_id_str in cart:
-        product_name = cart[product_id_str]['name']
         del cart[product_id_str]
-        session['cart'] = cart
         session.modified = True
     
+    product = db.session.get(Product, product_id)
+    product_name = product.name if product else 'Item'
     return jsonify({'success': True, 'message': f'{product_name} removed from cart!'})
 
 
 # ------------------- SHOP API ROUTES (For Dynamic Operations) -------------------
 
+# Product images are stored as plain Unsplash URLs; size and format parameters are added
+# here at render time, so they can change without touching the stored data
+PRODUCT_IMAGE_WIDTHS = (400, 800)
+
+
+def _image_url(url, width):
+    parts = urlsplit(url or '')
+    if parts.hostname != 'images.unsplash.com':
+        return url
+    query = dict(parse_qsl(parts.query))
+    query.update(w=width, q=60, auto='format')
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _image_srcset(url):
+    if urlsplit(url or '').hostname != 'images.unsplash.com':
+        return ''
+    return ', '.join(f'{_image_url(url, width)} {width}w' for width in PRODUCT_IMAGE_WIDTHS)
+
+
+# The catalog JSON and its ETag are cached together; product writes clear the cache
+def _products_json():
+    cached = cache.get('products_json')
+    if cached is None:
+        rows = db.session.execute(lambda_stmt(lambda: select(
+            Product.id, Product.name, Product.category, Product.price_cents, Product.image,
+            Product.seller_id, Product.description, Product.stock, Product.origin
+        ))).all()
+        products_data = [dict(row._mapping) for row in rows]
+        for product in products_data:
+            product['srcset'] = _image_srcset(product['image'])
+        body = json.dumps(products_data).encode()
+        cached = (body, hashlib.md5(body).hexdigest())
+        cache.set('products_json', cached)
+    return cached
+
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        products = Product.query.all()
-        products_data = []
-        for product in products:
-            product_data = {
-                'id': product.id,
-                'name': product.name,
-                'category': product.category,
-                'price': product.price,
-                'image': product.image,
-                'seller_id': product.seller_id
-            }
-            # Safely add description and stock if they exist
-            if hasattr(product, 'description') and product.description:
-                product_data['description'] = product.description
-            if hasattr(product, 'stock') and product.stock is not None:
-                product_data['stock'] = product.stock
-            if hasattr(product, 'origin') and product.origin:
-                product_data['origin'] = product.origin
-                
-            products_data.append(product_data)
-        return jsonify(products_data)
+        body, etag = _products_json()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        # Answers 304 Not Modified when the client's If-None-Match matches
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -252,87 +415,60 @@ def get_products():
 @app.route('/api/products', methods=['POST'])
 def api_add_product():
     try:
-        data = request.get_json()
-        
-        # Create product with basic fields
-        product_data = {
-            'name': data['name'],
-            'category': data['category'],
-            'price': float(data['price']),
-            'image': data.get('image', 'https://images.unsplash.com/photo-1613478223719-2ab802602423?w=400&q=80'),
-            'seller_id': session.get('user', 1)  # Use session user or default
-        }
-        
-        # Add optional fields
-        if 'description' in data:
-            product_data['description'] = data['description']
-        if 'stock' in data:
-            product_data['stock'] = int(data['stock'])
-        if 'origin' in data:
-            product_data['origin'] = data['origin']
-            
-        new_product = Product(**product_data)
-        db.session.add(new_product)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Product added successfully!', 
-            'id': new_product.id
-        })
-        
-    except Exception as e:
+        product_in = ProductIn.model_validate_json(request.data)
+    except ValidationError as e:
         return jsonify({
             'success': False, 
             'error': str(e)
         }), 400
 
+    product_data = product_in.to_columns()
+    product_data.setdefault('image', 'https://images.unsplash.com/photo-1613478223719-2ab802602423?w=400&q=80')
+    new_product = Product(**product_data, seller_id=session.get('user', 1))  # Use session user or default
+    db.session.add(new_product)
+    db.session.commit()
+    cache.clear()
+    
+    return jsonify({
+        'success': True, 
+        'message': 'Product added successfully!', 
+        'id': new_product.id
+    })
+
 
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
 def api_update_product(product_id):
+    product = db.get_or_404(Product, product_id)
     try:
-        product = Product.query.get_or_404(product_id)
-        data = request.get_json()
-        
-        # Update basic fields
-        product.name = data['name']
-        product.category = data['category']
-        product.price = float(data['price'])
-        
-        # Update image if provided
-        if 'image' in data:
-            product.image = data['image']
-            
-        # Update optional fields
-        if 'description' in data:
-            product.description = data['description']
-        if 'stock' in data:
-            product.stock = int(data['stock'])
-        if 'origin' in data:
-            product.origin = data['origin']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Product updated successfully!'
-        })
-        
-    except Exception as e:
+        product_in = ProductIn.model_validate_json(request.data)
+    except ValidationError as e:
         return jsonify({
             'success': False, 
             'error': str(e)
         }), 400
 
+    # Optional fields left out of the request keep their current values
+    for field, value in product_in.to_columns().items():
+        setattr(product, field, value)
+    
+    db.session.commit()
+    cache.clear()
+    
+    return jsonify({
+        'success': True, 
+        'message': 'Product updated successfully!'
+    })
+
 
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
 def api_delete_product(product_id):
+    product = db.get_or_404(Product, product_id)
     try:
-        product = Product.query.get_or_404(product_id)
         product_name = product.name
         
         db.session.delete(product)
         db.session.commit()
+        cache.clear()
         
         return jsonify({
             'success': True, 
@@ -350,27 +486,19 @@ def api_delete_product(product_id):
 def api_get_cart():
     try:
         cart = session.get('cart', {})
-        cart_items = []
-        total = 0
+        cart_items = _cart_items(cart)
+        subtotals = [price * quantity for price, quantity in map(_price_and_quantity, cart_items)]
+        total_cents = sum(subtotals)
         
-        for product_id, item in cart.items():
-            product = Product.query.get(int(product_id))
-            if product:
-                subtotal = item['price'] * item['quantity']
-                cart_items.append({
-                    'id': product.id,
-                    'name': item['name'],
-                    'price': item['price'],
-                    'quantity': item['quantity'],
-                    'subtotal': subtotal,
-                    'image': item.get('image', 'https://images.unsplash.com/photo-1613478223719-2ab802602423?w=400&q=80')
-                })
-                total += subtotal
+        for item, subtotal in zip(cart_items, subtotals):
+            item['subtotal_cents'] = subtotal
+            # Cart thumbnails are 80px wide, so 160 covers high-DPI screens
+            item['image'] = _image_url(item['image'] or 'https://images.unsplash.com/photo-1613478223719-2ab802602423?w=400&q=80', 160)
         
         return jsonify({
             'success': True,
             'items': cart_items, 
-            'total': total,
+            'total_cents': total_cents,
             'cart_count': len(cart)
         })
         
@@ -384,39 +512,24 @@ def api_get_cart():
 @app.route('/api/cart', methods=['POST'])
 def api_add_to_cart():
     try:
-        data = request.get_json()
-        product_id = data['product_id']
-        quantity = data.get('quantity', 1)
-        
-        product = Product.query.get_or_404(product_id)
-        
-        cart = session.get('cart', {})
-        
-        if str(product_id) in cart:
-            cart[str(product_id)]['quantity'] += quantity
-        else:
-            cart[str(product_id)] = {
-                'id': product.id,
-                'name': product.name,
-                'price': float(product.price),
-                'quantity': quantity,
-                'image': product.image
-            }
-        
-        session['cart'] = cart
-        session.modified = True
-        
-        return jsonify({
-            'success': True,
-            'message': f'{product.name} added to cart!', 
-            'cart_count': len(cart)
-        })
-        
-    except Exception as e:
+        item = CartItemIn.model_validate_json(request.data)
+    except ValidationError as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
+    
+    product = db.get_or_404(Product, item.product_id)
+    
+    cart = session.setdefault('cart', {})
+    cart[str(item.product_id)] = cart.get(str(item.product_id), 0) + item.quantity
+    session.modified = True
+    
+    return jsonify({
+        'success': True,
+        'message': f'{product.name} added to cart!', 
+        'cart_count': len(cart)
+    })
 
 
 @app.route('/api/cart/remove/<int:product_id>', methods=['DELETE'])
@@ -426,11 +539,11 @@ def api_remove_from_cart(product_id):
         product_id_str = str(product_id)
         
         if product_id_str in cart:
-            product_name = cart[product_id_str]['name']
             del cart[product_id_str]
-            session['cart'] = cart
             session.modified = True
             
+            product = db.session.get(Product, product_id)
+            product_name = product.name if product else 'Item'
             return jsonify({
                 'success': True,
                 'message': f'{product_name} removed from cart!',
@@ -470,7 +583,7 @@ def admin_dashboard():
         return redirect(url_for('login'))
 
     users = User.query.all()
-    products = Product.query.all()
+    products = db.session.scalars(db.select(Product).options(selectinload(Product.seller))).all()
     return render_template('admin_dashboard.html', users=users, products=products)
 
 
@@ -482,4 +595,5 @@ def test_session():
     return f"Session set! Value = {session.get('test_value')}"
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Debug mode and its reloader (which imports the app twice) follow FLASK_DEBUG
+    app.run()
\ No newline at end of file
@@ -1,9 +1,28 @@
 import os
+import redis
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
 
 class Config:
     SECRET_KEY = 'your_secret_key_here'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'database', 'agrifarma.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Shared by all workers, so cache.clear() after a product write reaches every process.
+    # The key prefix keeps clear() to cache keys; without one it would FLUSHDB the sessions too.
+    CACHE_TYPE = 'RedisCache'
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_KEY_PREFIX = 'cache:'
+    CACHE_DEFAULT_TIMEOUT = 60
+    # scrypt (n=2**15, r=8, p=1) verifies faster than high-iteration pbkdf2; needs Werkzeug >= 2.3
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    # Server-side sessions: the cookie only carries a session id, the cart lives in Redis
+    SESSION_TYPE = 'redis'
+    SESSION_REDIS = redis.from_url(REDIS_URL)
+    # Flask-Session defaults to 31-day permanent sessions; keep cookies ending with the browser session
+    SESSION_PERMANENT = False
+    # Forum posts are written in batches of up to FORUM_BATCH_SIZE, at most FORUM_FLUSH_INTERVAL seconds apart
+    FORUM_QUEUE_SIZE = 1000
+    FORUM_BATCH_SIZE = 50
+    FORUM_FLUSH_INTERVAL = 0.2
      
\ No newline at end of file
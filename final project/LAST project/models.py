@@ -7,30 +7,40 @@ db = SQLAlchemy()
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
-    email = db.Column(db.String(100), unique=True)
+    email = db.Column(db.String(100), unique=True, index=True)
     password = db.Column(db.String(200))
     role = db.Column(db.String(20), default='user')  # admin or user
+    # lazy='raise' turns accidental per-row lazy loads (N+1 queries) into errors; eager-load instead
+    posts = db.relationship('ForumPost', back_populates='author', lazy='raise')
+    products = db.relationship('Product', back_populates='seller', lazy='raise')
 
 # Forum posts
 class ForumPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150))
     content = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    author = db.relationship('User', back_populates='posts', lazy='raise')
 
 # Products - Updated with agriculture fields
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
-    category = db.Column(db.String(50))
-    price = db.Column(db.Float)
+    category = db.Column(db.String(50), index=True)
+    price_cents = db.Column(db.Integer)  # whole cents, so totals are exact integer math
     image = db.Column(db.String(200))
-    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     # New agriculture fields
     description = db.Column(db.Text, default='')
     stock = db.Column(db.Integer, default=0)
     origin = db.Column(db.String(100), default='')
+    seller = db.relationship('User', back_populates='products', lazy='raise')
+
+    # Dollar value for display in templates; code doing arithmetic should use price_cents
+    @property
+    def price(self):
+        return self.price_cents / 100 if self.price_cents is not None else None
 
 # Cart
 class Cart(db.Model):
@@ -0,0 +1,24 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# JSON request bodies for the shop API
+
+class ProductIn(BaseModel):
+    name: str
+    category: str
+    # Finite and bounded so the conversion to integer cents can't overflow
+    price: float = Field(ge=0, le=1_000_000, allow_inf_nan=False)
+    image: Optional[str] = None
+    description: Optional[str] = None
+    stock: Optional[int] = None
+    origin: Optional[str] = None
+
+    def to_columns(self):
+        """Product column values, with the dollar price converted to integer cents."""
+        data = self.model_dump(exclude_none=True)
+        data['price_cents'] = round(data.pop('price') * 100)
+        return data
+
+class CartItemIn(BaseModel):
+    product_id: int
+    quantity: int = Field(default=1, ge=1)